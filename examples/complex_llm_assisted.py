@@ -5,22 +5,13 @@ These examples use complex Python idioms, decorators, dynamic behavior,
 and patterns that may not translate well with deterministic rules alone.
 """
 
-from functools import wraps
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from itertools import batched
 
 
 # Example 1: Decorator with state
-def memoize(func):
-    """Decorator that caches function results."""
-    cache = {}
-    @wraps(func)
-    def wrapper(*args):
-        if args not in cache:
-            cache[args] = func(*args)
-        return cache[args]
-    return wrapper
-
-
-@memoize
+@lru_cache(maxsize=None)
 def fibonacci(n):
     """Calculate nth Fibonacci number with memoization."""
     if n <= 1:
@@ -32,19 +23,20 @@ def fibonacci(n):
 def process_user_data(users):
     """
     Process user data with complex filtering and transformation.
-    This uses nested comprehensions with multiple conditions.
+    This uses nested comprehensions with multiple conditions, binding
+    each user's scores once with an assignment expression.
     """
     return {
         user['id']: {
             'name': user['name'].upper(),
             'email': user['email'].lower(),
-            'scores': [s * 10 for s in user.get('scores', []) if s >= 0.5],
-            'average': sum(user.get('scores', [])) / len(user.get('scores', [1]))
+            'scores': [s * 10 for s in scores if s >= 0.5],
+            'average': sum(scores) / len(scores)
         }
         for user in users
-        if user.get('active') 
+        if user.get('active')
         and user.get('age', 0) >= 18
-        and len(user.get('scores', [])) >= 3
+        and len(scores := user.get('scores', [])) >= 3
     }
 
 
@@ -87,25 +79,18 @@ class DynamicConfig:
 
 
 # Example 5: Generator with complex logic
-def batch_process(items, batch_size=10):
+def batch_process(items: Iterable[object], batch_size: int = 10) -> Iterator[list[str]]:
     """
     Process items in batches with filtering and transformation.
-    Uses generator with complex control flow.
+    Uses a generator pipeline, leaving the batching to itertools.batched.
     """
-    batch = []
-    for item in items:
-        if item is None or item == '':
-            continue
-        
-        processed = item.strip().lower() if isinstance(item, str) else str(item)
-        batch.append(processed)
-        
-        if len(batch) >= batch_size:
-            yield batch
-            batch = []
-    
-    if batch:
-        yield batch
+    processed = (
+        item.strip().lower() if isinstance(item, str) else str(item)
+        for item in items
+        if item is not None and item != ''
+    )
+    for batch in batched(processed, batch_size):
+        yield list(batch)
 
 
 if __name__ == "__main__":
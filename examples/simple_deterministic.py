@@ -5,27 +5,33 @@ These examples use simple, well-structured Python patterns that
 translate well using py2many's deterministic rules.
 """
 
+
 # Example 1: Simple mathematical function
-def factorial(n):
+def factorial(n: int) -> int:
     """Calculate factorial of n."""
-    if n <= 1:
-        return 1
-    return n * factorial(n - 1)
+    result = 1
+    for i in range(2, n + 1):
+        result *= i
+    return result
 
 
 # Example 2: List operations
-def sum_even_numbers(numbers):
+def sum_even_numbers(numbers: list[int]) -> int:
     """Sum all even numbers in a list."""
-    return sum(n for n in numbers if n % 2 == 0)
+    total = 0
+    for n in numbers:
+        if n % 2 == 0:
+            total += n
+    return total
 
 
 # Example 3: Basic algorithm
-def find_max(numbers):
+def find_max(numbers: list[int]) -> int | None:
     """Find the maximum value in a list."""
     if not numbers:
         return None
     max_val = numbers[0]
-    for n in numbers[1:]:
+    for n in numbers:
         if n > max_val:
             max_val = n
     return max_val
@@ -7,4 +7,9 @@ import asyncio
 from mcp_server_py2many.server import main
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
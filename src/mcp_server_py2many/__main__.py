@@ -5,7 +5,13 @@ from .server import main as _main
 
 def main():
     """Run the MCP server."""
-    asyncio.run(_main())
+    # uvloop speeds up the stdio transport; it isn't available on Windows
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(_main())
+    else:
+        uvloop.run(_main())
 
 
 if __name__ == "__main__":
@@ -8,108 +8,425 @@ py2many and LLM-assisted translation via the --llm flag.
 """
 
 import asyncio
+import hashlib
+from collections import OrderedDict
+import json
 import re
-import subprocess
+import shutil
+import sys
+import sysconfig
 import tempfile
 import os
-from typing import Literal
+from typing import Literal, NamedTuple
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
-
-
-# Supported languages by py2many
-SUPPORTED_LANGUAGES = {
-    "cpp": "C++",
-    "rust": "Rust",
-    "go": "Go",
-    "kotlin": "Kotlin",
-    "dart": "Dart",
-    "julia": "Julia",
-    "nim": "Nim",
-    "vlang": "V",
-    "mojo": "Mojo",
-    "dlang": "D",
-    "zig": "Zig",
+from mcp.types import ListToolsResult, Tool, TextContent
+
+
+# Supported languages by py2many: code -> (display name, output file extension)
+_LANG_TABLE: dict[str, tuple[str, str]] = {
+    "cpp": ("C++", ".cpp"),
+    "rust": ("Rust", ".rs"),
+    "go": ("Go", ".go"),
+    "kotlin": ("Kotlin", ".kt"),
+    "dart": ("Dart", ".dart"),
+    "julia": ("Julia", ".jl"),
+    "nim": ("Nim", ".nim"),
+    "vlang": ("V", ".v"),
+    "mojo": ("Mojo", ".mojo"),
+    "dlang": ("D", ".d"),
+    "zig": ("Zig", ".zig"),
 }
+SUPPORTED_LANGUAGES = {code: name for code, (name, _) in _LANG_TABLE.items()}
+
+# Run py2many directly when it is installed (it is a dependency of this
+# package), falling back to uvx, which resolves the package on every call
+_PY2MANY = shutil.which("py2many") or shutil.which("py2many", path=sysconfig.get_path("scripts"))
+_PY2MANY_CMD = [_PY2MANY] if _PY2MANY else ["uvx", "py2many"]
+
+# Keep scratch files on RAM-backed tmpfs where available
+_TMPDIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
 
 app = Server("mcp-server-py2many")
 
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available transpiler tools."""
-    return [
-        Tool(
-            name="transpile_python",
-            description="Transpile Python code to another programming language using py2many. "
-            "Use deterministic translation for simple, well-structured Python code. "
-            "For complex code or when the deterministic translation fails, consider using "
-            "the transpile_python_with_llm tool instead.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "python_code": {
-                        "type": "string",
-                        "description": "The Python code to transpile",
-                    },
-                    "target_language": {
-                        "type": "string",
-                        "enum": list(SUPPORTED_LANGUAGES.keys()),
-                        "description": f"Target language. Supported: {', '.join(SUPPORTED_LANGUAGES.values())}",
-                    },
+class Py2ManyWorker:
+    """A long-lived py2many worker process speaking the worker protocol."""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+
+    @classmethod
+    async def start(cls) -> "Py2ManyWorker":
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "mcp_server_py2many.worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        return cls(proc)
+
+    async def request(self, code: str, lang: str, ext: str) -> dict:
+        """Send one transpilation request and wait for its response."""
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        payload = json.dumps({"code": code, "lang": lang, "ext": ext}).encode()
+        self.proc.stdin.write(len(payload).to_bytes(4, "big") + payload)
+        await self.proc.stdin.drain()
+        try:
+            header = await self.proc.stdout.readexactly(4)
+            response = await self.proc.stdout.readexactly(int.from_bytes(header, "big"))
+        except asyncio.IncompleteReadError:
+            raise RuntimeError("py2many worker exited unexpectedly")
+        return json.loads(response)
+
+    def kill(self):
+        if self.proc.returncode is None:
+            self.proc.kill()
+
+
+class Py2ManyWorkerPool:
+    """Bounded pool of py2many workers shared by deterministic transpilations.
+
+    Workers are started lazily and reused, so py2many is imported once per
+    worker rather than once per request. Concurrent identical requests are
+    coalesced onto a single worker call. LLM-assisted runs never go through
+    the pool since they may hold stateful API sessions.
+    """
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[Py2ManyWorker] = []
+        self._workers: list[Py2ManyWorker] = []
+        self._inflight: dict[str, asyncio.Task[dict]] = {}
+
+    async def acquire(self) -> Py2ManyWorker:
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            worker = await Py2ManyWorker.start()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._workers.append(worker)
+        return worker
+
+    def release(self, worker: Py2ManyWorker):
+        self._idle.append(worker)
+        self._slots.release()
+
+    def discard(self, worker: Py2ManyWorker):
+        worker.kill()
+        self._workers.remove(worker)
+        self._slots.release()
+
+    async def transpile(self, code: str, lang: str, timeout: float = 60) -> dict:
+        """Transpile code on a pooled worker, sharing identical in-flight requests.
+
+        The shared call runs in its own task, so cancelling one caller
+        doesn't cancel it for the others waiting on the same result.
+        """
+        key = _config_hash(code=code, lang=lang, llm=False)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._transpile(code, lang, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def _transpile(self, code: str, lang: str, timeout: float) -> dict:
+        worker = await self.acquire()
+        try:
+            result = await asyncio.wait_for(worker.request(code, lang, _LANG_TABLE[lang][1]), timeout)
+        except BaseException:
+            # The worker may be mid-request; it can't be reused safely
+            self.discard(worker)
+            raise
+        self.release(worker)
+        return result
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every caller may have been cancelled; don't warn about an
+        # exception nobody was left to retrieve
+        if not task.cancelled():
+            task.exception()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.kill()
+            await worker.proc.wait()
+        self._workers.clear()
+        self._idle.clear()
+
+
+def _config_hash(**config) -> str:
+    """Hash a request config independently of the order of its keys."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+_pool = Py2ManyWorkerPool(size=min(4, os.cpu_count() or 1))
+
+
+class Z3Worker:
+    """A long-lived ``z3 -in`` process answering one query at a time."""
+
+    # Echoed after each query so the end of its output can be found
+    _DONE = "__mcp_server_py2many_done__"
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+
+    @classmethod
+    async def start(cls) -> "Z3Worker":
+        proc = await asyncio.create_subprocess_exec(
+            "z3",
+            "-in",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        return cls(proc)
+
+    async def query(self, smt: bytes) -> str:
+        """Run an SMT-LIB script and return z3's output for it.
+
+        The solver is reset afterwards so nothing leaks into the next query.
+        If the script makes z3 exit, the output up to that point is returned
+        and the worker is left dead.
+        """
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        self.proc.stdin.write(smt + f'\n(echo "{self._DONE}")\n(reset)\n'.encode())
+        await self.proc.stdin.drain()
+        output = []
+        while raw := await self.proc.stdout.readline():
+            line = raw.decode()
+            if line.rstrip() == self._DONE:
+                break
+            output.append(line)
+        return "".join(output)
+
+    def kill(self):
+        if self.proc.returncode is None:
+            self.proc.kill()
+
+
+class Z3Pool:
+    """Bounded pool of warm z3 processes shared by verify_python requests."""
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[Z3Worker] = []
+        self._workers: list[Z3Worker] = []
+
+    async def acquire(self) -> Z3Worker:
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            worker = await Z3Worker.start()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._workers.append(worker)
+        return worker
+
+    def release(self, worker: Z3Worker):
+        assert worker.proc.stdout is not None
+        if worker.proc.returncode is not None or worker.proc.stdout.at_eof():
+            self.discard(worker)
+            return
+        self._idle.append(worker)
+        self._slots.release()
+
+    def discard(self, worker: Z3Worker):
+        worker.kill()
+        self._workers.remove(worker)
+        self._slots.release()
+
+    async def check(self, smt: bytes, well_formed: bool, timeout: float = 60) -> str:
+        """Run an SMT-LIB script on a pooled z3 process.
+
+        A script that isn't well formed (see _add_preconditions) would swallow
+        the end-of-query marker, so it runs on a one-shot z3 instead.
+        """
+        if not well_formed:
+            stdout, _ = await _run_command_bytes(["z3", "-in"], input=smt, timeout=timeout)
+            return stdout.decode()
+        worker = await self.acquire()
+        try:
+            output = await asyncio.wait_for(worker.query(smt), timeout)
+        except BaseException:
+            # z3 may still be solving; it can't be reused safely
+            self.discard(worker)
+            raise
+        self.release(worker)
+        return output
+
+    async def close(self):
+        for worker in self._workers:
+            worker.kill()
+            await worker.proc.wait()
+        self._workers.clear()
+        self._idle.clear()
+
+
+_z3_pool = Z3Pool(size=min(8, os.cpu_count() or 1))
+
+# LRU cache of tool outputs for deterministic runs, keyed by
+# (code digest, target language, use_llm)
+_CACHE_SIZE = 256
+_result_cache: OrderedDict[tuple[bytes, str, bool], str] = OrderedDict()
+
+
+def _cache_key(python_code: str, target_language: str, use_llm: bool) -> tuple[bytes, str, bool]:
+    digest = hashlib.blake2b(python_code.encode(), digest_size=16).digest()
+    return (digest, target_language, use_llm)
+
+
+def _cache_get(key: tuple[bytes, str, bool]) -> str | None:
+    result = _result_cache.get(key)
+    if result is not None:
+        _result_cache.move_to_end(key)
+    return result
+
+
+def _cache_put(key: tuple[bytes, str, bool], result: str):
+    _result_cache[key] = result
+    _result_cache.move_to_end(key)
+    if len(_result_cache) > _CACHE_SIZE:
+        _result_cache.popitem(last=False)
+
+
+_LANG_KEYS = list(SUPPORTED_LANGUAGES)
+_LANG_VALUES_STR = ", ".join(SUPPORTED_LANGUAGES.values())
+_LANGUAGES_TEXT = "\n".join(f"- {code}: {name}" for code, name in SUPPORTED_LANGUAGES.items())
+
+# Tool definitions are static, so build them once at import time
+_TOOLS: list[Tool] = [
+    Tool(
+        name="transpile_python",
+        description="Transpile Python code to another programming language using py2many. "
+        "Use deterministic translation for simple, well-structured Python code. "
+        "For complex code or when the deterministic translation fails, consider using "
+        "the transpile_python_with_llm tool instead.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "python_code": {
+                    "type": "string",
+                    "description": "The Python code to transpile",
                 },
-                "required": ["python_code", "target_language"],
-            },
-        ),
-        Tool(
-            name="transpile_python_with_llm",
-            description="Transpile Python code to another language using py2many with LLM assistance. "
-            "Use this for complex Python code, when dealing with language-specific idioms, "
-            "or when the deterministic translation produces incorrect or non-idiomatic results.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "python_code": {
-                        "type": "string",
-                        "description": "The Python code to transpile",
-                    },
-                    "target_language": {
-                        "type": "string",
-                        "enum": list(SUPPORTED_LANGUAGES.keys()),
-                        "description": f"Target language. Supported: {', '.join(SUPPORTED_LANGUAGES.values())}",
-                    },
+                "target_language": {
+                    "type": "string",
+                    "enum": _LANG_KEYS,
+                    "description": f"Target language. Supported: {_LANG_VALUES_STR}",
                 },
-                "required": ["python_code", "target_language"],
             },
-        ),
-        Tool(
-            name="list_supported_languages",
-            description="List all supported target languages for transpilation",
-            inputSchema={
-                "type": "object",
-                "properties": {},
+            "required": ["python_code", "target_language"],
+        },
+    ),
+    Tool(
+        name="transpile_python_with_llm",
+        description="Transpile Python code to another language using py2many with LLM assistance. "
+        "Use this for complex Python code, when dealing with language-specific idioms, "
+        "or when the deterministic translation produces incorrect or non-idiomatic results.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "python_code": {
+                    "type": "string",
+                    "description": "The Python code to transpile",
+                },
+                "target_language": {
+                    "type": "string",
+                    "enum": _LANG_KEYS,
+                    "description": f"Target language. Supported: {_LANG_VALUES_STR}",
+                },
             },
-        ),
-        Tool(
-            name="verify_python",
-            description="Verify Python code using SMT and z3 solver. "
-            "Transpiles Python code using --smt flag and verifies that the inverse "
-            "of pre/post conditions are unsat (i.e., the implementation matches the spec). "
-            "Returns SAT if a counterexample is found (bug detected), UNSAT if verified.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "python_code": {
-                        "type": "string",
-                        "description": "The Python code to verify",
-                    },
+            "required": ["python_code", "target_language"],
+        },
+    ),
+    Tool(
+        name="list_supported_languages",
+        description="List all supported target languages for transpilation",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        },
+    ),
+    Tool(
+        name="verify_python",
+        description="Verify Python code using SMT and z3 solver. "
+        "Transpiles Python code using --smt flag and verifies that the inverse "
+        "of pre/post conditions are unsat (i.e., the implementation matches the spec). "
+        "Returns SAT if a counterexample is found (bug detected), UNSAT if verified.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "python_code": {
+                    "type": "string",
+                    "description": "The Python code to verify",
                 },
-                "required": ["python_code"],
             },
-        ),
-    ]
+            "required": ["python_code"],
+        },
+    ),
+]
+
+
+# Returning a prebuilt result lets the SDK hand it straight to the session
+# instead of wrapping and revalidating the tool list on every request
+_LIST_TOOLS_RESULT = ListToolsResult(tools=_TOOLS)
+
+
+@app.list_tools()
+async def list_tools() -> ListToolsResult:
+    """List available transpiler tools."""
+    return _LIST_TOOLS_RESULT
+
+
+async def _run_command_bytes(cmd: list[str], input: bytes | None = None, timeout: float = 60) -> tuple[bytes, bytes]:
+    """Run a command without blocking the event loop, returning raw (stdout, stderr)."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input), timeout)
+    except BaseException:
+        # Timed out or cancelled: don't leave the child running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return stdout, stderr
+
+
+async def _run_command(cmd: list[str], input: str | None = None, timeout: float = 60) -> tuple[str, str]:
+    """Run a command without blocking the event loop, returning (stdout, stderr)."""
+    stdout, stderr = await _run_command_bytes(
+        cmd, input.encode() if input is not None else None, timeout
+    )
+    return stdout.decode(), stderr.decode()
+
+
+def _write_file(path: str, content: str):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _read_file_if_exists(path: str) -> str:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
 
 
 async def run_py2many(
@@ -118,56 +435,62 @@ async def run_py2many(
     use_llm: bool = False,
 ) -> str:
     """Run py2many transpiler on the given Python code."""
-    # Create a temporary file for the Python code
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
-        f.write(python_code)
-        temp_path = f.name
+    if not use_llm:
+        # Deterministic output only depends on the code and language
+        cache_key = _cache_key(python_code, target_language, use_llm)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
 
+        try:
+            result = await _pool.transpile(python_code, target_language)
+        except TimeoutError:
+            return "Error: Transpilation timed out after 60 seconds."
+        except Exception as e:
+            return f"Error during transpilation: {str(e)}"
+
+        output_parts = []
+        if result["stdout"]:
+            output_parts.append(f"=== stdout ===\n{result['stdout']}")
+        if result["stderr"]:
+            output_parts.append(f"=== stderr ===\n{result['stderr']}")
+        if result["code"]:
+            output_parts.append(f"=== Generated {target_language.upper()} code ===\n{result['code']}")
+
+        output = "\n\n".join(output_parts) if output_parts else "No output generated."
+        # An exception inside the worker isn't py2many's answer for this
+        # code, so a retry should get a fresh attempt
+        if not result["error"]:
+            _cache_put(cache_key, output)
+        return output
+
+    # LLM runs get a dedicated py2many process each, working in a private
+    # temporary directory so the whole directory can be removed afterwards.
+    # Filesystem work is done off the event loop.
     try:
-        # Build the command
-        cmd = ["uvx", "py2many", f"--{target_language}"]
-        if use_llm:
-            cmd.append("--llm")
-        cmd.append(temp_path)
-
-        # Run py2many
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
+        temp_dir = await asyncio.to_thread(tempfile.mkdtemp, dir=_TMPDIR)
+        try:
+            temp_path = os.path.join(temp_dir, "input.py")
+            await asyncio.to_thread(_write_file, temp_path, python_code)
 
-        # Determine the output file path
-        base_path = temp_path.replace(".py", "")
-        extension_map = {
-            "cpp": ".cpp",
-            "rust": ".rs",
-            "go": ".go",
-            "kotlin": ".kt",
-            "dart": ".dart",
-            "julia": ".jl",
-            "nim": ".nim",
-            "vlang": ".v",
-            "mojo": ".mojo",
-            "dlang": ".d",
-            "zig": ".zig",
-        }
-        output_path = base_path + extension_map.get(target_language, ".txt")
-
-        # Read the output file if it exists
-        if os.path.exists(output_path):
-            with open(output_path, "r") as f:
-                output_code = f.read()
-        else:
-            output_code = ""
+            # Run py2many
+            cmd = [*_PY2MANY_CMD, f"--{target_language}", "--llm", temp_path]
+            stdout, stderr = await _run_command(cmd)
+
+            # Determine the output file path
+            output_path = os.path.join(temp_dir, "input" + _LANG_TABLE[target_language][1])
+
+            # Read the output file if it exists
+            output_code = await asyncio.to_thread(_read_file_if_exists, output_path)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
 
         # Combine stdout, stderr, and output code
         output_parts = []
-        if result.stdout:
-            output_parts.append(f"=== stdout ===\n{result.stdout}")
-        if result.stderr:
-            output_parts.append(f"=== stderr ===\n{result.stderr}")
+        if stdout:
+            output_parts.append(f"=== stdout ===\n{stdout}")
+        if stderr:
+            output_parts.append(f"=== stderr ===\n{stderr}")
         if output_code:
             output_parts.append(f"=== Generated {target_language.upper()} code ===\n{output_code}")
 
@@ -176,137 +499,195 @@ async def run_py2many(
 
         return "\n\n".join(output_parts)
 
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         return "Error: Transpilation timed out after 60 seconds."
     except Exception as e:
         return f"Error during transpilation: {str(e)}"
-    finally:
-        # Clean up temporary files
-        try:
-            os.unlink(temp_path)
-            # Also clean up output file if it exists
-            base_path = temp_path.replace(".py", "")
-            for ext in [".cpp", ".rs", ".go", ".kt", ".dart", ".jl", ".nim", ".v", ".mojo", ".d", ".zig"]:
-                output_file = base_path + ext
-                if os.path.exists(output_file):
-                    os.unlink(output_file)
-        except OSError:
-            pass
+
+
+# SMT-LIB tokens: whitespace, comments, string literals, quoted symbols,
+# parentheses and plain atoms
+_SMT_TOKEN = re.compile(rb'\s+|;[^\n]*|"(?:[^"]|"")*"|\|[^|]*\||[()]|[^\s()";|]+')
+
+
+# Cheap checks for the two things _add_preconditions rewrites, so SMT without
+# a precondition or a main assertion is never parsed
+_PRE_DEFINE = re.compile(rb"\(define-fun\s+[^\s()]+-pre[\s(]")
+_ASSERT_NEG_EQ = re.compile(rb"\(assert\s*\(not\s*\(=")
+
+
+# Comments, string literals and quoted symbols, whose contents don't count
+# towards paren balance
+_SMT_QUOTED = re.compile(rb';[^\n]*|"(?:[^"]|"")*"|\|[^|]*\|')
+_NOT_PAREN = bytes(b for b in range(256) if b not in b"()")
+
+
+def _smt_balanced(smt: bytes) -> bool:
+    """Whether SMT-LIB has balanced parens and no unterminated string or quoted symbol.
+
+    A fast stand-in for _parse_smt when only well-formedness is needed.
+    """
+    parens = _SMT_QUOTED.sub(b"", smt)
+    if b'"' in parens or b"|" in parens:
+        return False
+    parens = parens.translate(None, _NOT_PAREN)
+    while b"()" in parens:
+        parens = parens.replace(b"()", b"")
+    return not parens
+
+
+class _Sexp(NamedTuple):
+    """A parsed s-expression: an atom (bytes) or a list of _Sexp, with its span."""
+
+    value: "bytes | list[_Sexp]"
+    start: int
+    end: int
+
+
+def _parse_smt(smt: bytes) -> list[_Sexp]:
+    """Parse SMT-LIB into its top-level forms.
+
+    Raises ValueError on unbalanced parentheses or an unterminated string or
+    quoted symbol.
+    """
+    stack: list[list[_Sexp]] = [[]]
+    starts: list[int] = []
+    pos = 0
+    for match in _SMT_TOKEN.finditer(smt):
+        if match.start() != pos:
+            raise ValueError("unterminated string or quoted symbol in SMT")
+        pos = match.end()
+        token = match.group()
+        if token == b"(":
+            stack.append([])
+            starts.append(match.start())
+        elif token == b")":
+            if len(stack) == 1:
+                raise ValueError("unbalanced ')' in SMT")
+            items = stack.pop()
+            stack[-1].append(_Sexp(items, starts.pop(), match.end()))
+        elif not (token[:1].isspace() or token.startswith(b";")):
+            stack[-1].append(_Sexp(token, match.start(), match.end()))
+    if pos != len(smt):
+        raise ValueError("unterminated string or quoted symbol in SMT")
+    if len(stack) != 1:
+        raise ValueError("unbalanced '(' in SMT")
+    return stack[0]
+
+
+def _atom(sexp: _Sexp) -> bytes | None:
+    """The atom's bytes, or None for a list."""
+    return sexp.value if isinstance(sexp.value, bytes) else None
+
+
+def _items(sexp: _Sexp) -> list[_Sexp]:
+    """The list's items, or [] for an atom."""
+    return sexp.value if isinstance(sexp.value, list) else []
+
+
+def _head(sexp: _Sexp) -> bytes | None:
+    """The leading atom of a list, or None."""
+    items = _items(sexp)
+    return _atom(items[0]) if items else None
+
+
+def _contains_atom(sexp: _Sexp, atom: bytes) -> bool:
+    if isinstance(sexp.value, bytes):
+        return sexp.value == atom
+    return any(_contains_atom(item, atom) for item in sexp.value)
+
+
+def _add_preconditions(smt: bytes) -> tuple[bytes, bool]:
+    """Guard the main assertions with the preconditions of the calls they compare.
+
+    A main assertion has the form (assert (not (= lhs rhs))). When lhs or rhs
+    is a call to a function f that has an f-pre definition, the assertion is
+    conjoined with (f-pre args) using the call's own arguments, so
+    counterexamples must satisfy the precondition. Assertions that already
+    mention f-pre are left alone, as is SMT that can't be parsed.
+
+    Returns the SMT and whether it is well formed, so callers need not
+    tokenize it again.
+    """
+    if not (_PRE_DEFINE.search(smt) and _ASSERT_NEG_EQ.search(smt)):
+        return smt, _smt_balanced(smt)
+    try:
+        forms = _parse_smt(smt)
+    except ValueError:
+        return smt, False
+
+    pre_funcs = set()
+    for form in forms:
+        items = _items(form)
+        if _head(form) == b"define-fun" and len(items) > 1:
+            name = _atom(items[1])
+            if name is not None and name.endswith(b"-pre"):
+                pre_funcs.add(name)
+    if not pre_funcs:
+        return smt, True
+
+    edits = []
+    for form in forms:
+        items = _items(form)
+        if _head(form) != b"assert" or len(items) != 2:
+            continue
+        body = items[1]
+        negated = _items(body)
+        if _head(body) != b"not" or len(negated) != 2 or _head(negated[1]) != b"=":
+            continue
+        guards: list[bytes] = []
+        for operand in _items(negated[1])[1:]:
+            func = _atom(operand) or _head(operand)
+            if func is None:
+                continue
+            pre = func + b"-pre"
+            if pre not in pre_funcs or _contains_atom(body, pre):
+                continue
+            args = _items(operand)[1:]
+            if args:
+                guard = b"(%s %s)" % (pre, b" ".join(smt[arg.start:arg.end] for arg in args))
+            else:
+                guard = pre
+            if guard not in guards:
+                guards.append(guard)
+        if guards:
+            body_text = smt[body.start:body.end]
+            edits.append((form.start, form.end, b"(assert (and %s %s))" % (b" ".join(guards), body_text)))
+
+    for start, end, replacement in reversed(edits):
+        smt = smt[:start] + replacement + smt[end:]
+    return smt, True
 
 
 async def run_py2many_verify(python_code: str) -> str:
     """Verify Python code using py2many --smt and z3 solver."""
-    # Create a temporary file for the Python code
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
-        f.write(python_code)
-        temp_path = f.name
+    cache_key = _cache_key(python_code, "smt", False)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        # Run py2many --smt
-        cmd = ["uvx", "py2many", "--smt", temp_path]
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
-
-        if result.returncode != 0:
-            return f"Error running py2many --smt:\n{result.stderr}"
-
-        # Find the generated SMT file
-        smt_path = temp_path.replace(".py", ".smt")
-        if not os.path.exists(smt_path):
-            return f"Error: SMT file not generated at {smt_path}"
-
-        # Read the SMT file
-        with open(smt_path, "r") as f:
-            smt_content = f.read()
-
-        # Extract preconditions - look for define-fun with -pre suffix
-        pre_conditions = re.findall(r'\(define-fun ([a-zA-Z_][a-zA-Z0-9_-]*-pre)\b', smt_content)
-
-        # Extract variables from precondition definitions for proper function calls
-        pre_vars = {}
-        for line in smt_content.split('\n'):
-            if 'define-fun' in line and '-pre' in line:
-                func_match = re.search(r'define-fun\s+([a-zA-Z_][a-zA-Z0-9_-]*-pre)', line)
-                if func_match:
-                    func_name = func_match.group(1)
-                    params_match = re.search(r'define-fun\s+[a-zA-Z_][a-zA-Z0-9_-]*-pre\((.+?)\)\s+Bool', line)
-                    if params_match:
-                        params_str = params_match.group(1)
-                        params = re.findall(r'(\w+)\s+Int', params_str)
-                        pre_vars[func_name] = params
+        # Run py2many --smt, piping the code through stdin. In stdin mode
+        # py2many writes the SMT to stdout, and always exits non-zero, so
+        # success is judged by whether any SMT was produced.
+        cmd = [*_PY2MANY_CMD, "--smt", "--ignore-formatter-errors", "-"]
+        smt_bytes, smt_stderr = await _run_command_bytes(cmd, input=python_code.encode())
+        smt_err = smt_stderr.decode()
+        if not smt_bytes.strip():
+            return f"Error running py2many --smt:\n{smt_err}"
 
         # Build verification query: pre AND not(correct == buggy)
-        # Find all assert statements and modify the last one
-        lines = smt_content.strip().split('\n')
-        new_lines = []
-        pre_conditions = []
-
-        for line in lines:
-            # Extract precondition if defined
-            if '(define-fun ' in line and '-pre ' in line:
-                func_match = re.search(r'\(define-fun (\w+-pre)', line)
-                if func_match:
-                    pre_conditions.append(func_match.group(1))
-            new_lines.append(line)
-
-        # Modify the assertion to include preconditions
-        verification_lines = []
-        has_pre_assertion = False
-
-        for line in new_lines:
-            if line.strip().startswith('(assert'):
-                # Check if this is the main assertion (not (= ...))
-                if 'not (= ' in line or '(not (= ' in line:
-                    # Add precondition to the assertion
-                    if pre_conditions:
-                        # Get the variables for this precondition
-                        pre_func = pre_conditions[0]
-                        vars_str = ' '.join(pre_vars.get(pre_func, []))
-                        if vars_str:
-                            pre_call = f"({pre_func} {vars_str})"
-                        else:
-                            pre_call = pre_func
-                        pre_assert = f"(assert (and {pre_call} {line.strip()[8:-1]}))"
-                        verification_lines.append(pre_assert)
-                        has_pre_assertion = True
-                    else:
-                        verification_lines.append(line)
-                else:
-                    verification_lines.append(line)
-            else:
-                verification_lines.append(line)
+        verification_smt, well_formed = _add_preconditions(smt_bytes)
 
-        # If no precondition was found, use the original SMT
-        if not has_pre_assertion:
-            verification_smt = smt_content
-        else:
-            verification_smt = '\n'.join(verification_lines)
-
-        # Write verification SMT to temp file
-        verify_smt_path = temp_path.replace(".py", "_verify.smt")
-        with open(verify_smt_path, "w") as f:
-            f.write(verification_smt)
-
-        # Run z3
-        z3_result = subprocess.run(
-            ["z3", verify_smt_path],
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
-
-        z3_output = z3_result.stdout.strip()
+        # Run the query on a warm z3 process
+        z3_output = (await _z3_pool.check(verification_smt, well_formed)).strip()
         is_sat = "sat" in z3_output.lower()
         is_unsat = "unsat" in z3_output.lower()
 
         result_parts = []
-        result_parts.append(f"=== py2many --smt output ===\n{result.stdout}")
-        if result.stderr:
-            result_parts.append(f"=== stderr ===\n{result.stderr}")
+        result_parts.append(f"=== py2many --smt output ===\n{smt_bytes.decode()}")
+        if smt_err:
+            result_parts.append(f"=== stderr ===\n{smt_err}")
         result_parts.append(f"=== z3 verification result ===\n{z3_output}")
 
         if is_sat:
@@ -318,34 +699,21 @@ async def run_py2many_verify(python_code: str) -> str:
         else:
             result_parts.append(f"\n=== UNKNOWN RESULT ===")
 
-        return "\n".join(result_parts)
+        output = "\n".join(result_parts)
+        _cache_put(cache_key, output)
+        return output
 
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         return "Error: Verification timed out after 60 seconds."
     except Exception as e:
         return f"Error during verification: {str(e)}"
-    finally:
-        # Clean up temporary files
-        try:
-            os.unlink(temp_path)
-            smt_path = temp_path.replace(".py", ".smt")
-            if os.path.exists(smt_path):
-                os.unlink(smt_path)
-            verify_smt_path = temp_path.replace(".py", "_verify.smt")
-            if os.path.exists(verify_smt_path):
-                os.unlink(verify_smt_path)
-        except OSError:
-            pass
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Handle tool calls."""
     if name == "list_supported_languages":
-        languages_text = "\n".join(
-            [f"- {code}: {name}" for code, name in SUPPORTED_LANGUAGES.items()]
-        )
-        return [TextContent(type="text", text=f"Supported languages:\n\n{languages_text}")]
+        return [TextContent(type="text", text=f"Supported languages:\n\n{_LANGUAGES_TEXT}")]
 
     elif name == "transpile_python":
         python_code = arguments.get("python_code", "")
@@ -398,12 +766,16 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
 
 async def main():
     """Run the MCP server."""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options(),
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options(),
+            )
+    finally:
+        await _pool.close()
+        await _z3_pool.close()
 
 
 if __name__ == "__main__":
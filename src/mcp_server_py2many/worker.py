@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Long-lived py2many worker process.
+
+The worker imports py2many once and then services transpilation requests
+read from stdin. Each message in either direction is a JSON object preceded
+by a 4-byte big-endian length prefix. Requests look like
+``{"code": ..., "lang": ..., "ext": ...}`` and responses like
+``{"code": ..., "stdout": ..., "stderr": ..., "error": ...}``, where
+``error`` is true if py2many raised rather than reporting a failure itself.
+"""
+
+import contextlib
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+
+from py2many.cli import main as py2many_main  # type: ignore[import-untyped]
+
+_HEADER = struct.Struct(">I")
+
+# Keep scratch files on RAM-backed tmpfs where available
+_TMPDIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def read_message(stream) -> dict | None:
+    """Read one length-prefixed JSON message, or None at EOF."""
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    return json.loads(stream.read(length))
+
+
+def write_message(stream, message: dict) -> None:
+    """Write one length-prefixed JSON message."""
+    payload = json.dumps(message).encode()
+    stream.write(_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def transpile(code: str, lang: str, ext: str) -> dict:
+    """Transpile code with py2many, capturing its output.
+
+    py2many runs in file mode, which writes the generated code before the
+    formatter runs, so the unformatted code is still returned when the
+    formatter fails. The worker's cwd is restored afterwards, since py2many
+    changes directory for some formatters and doesn't always change back.
+    """
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    cwd = os.getcwd()
+    error = False
+    with tempfile.TemporaryDirectory(dir=_TMPDIR) as temp_dir:
+        input_path = os.path.join(temp_dir, "input.py")
+        with open(input_path, "w") as f:
+            f.write(code)
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                py2many_main([f"--{lang}", input_path])
+        except BaseException as e:
+            stderr.write(f"{e.__class__.__name__}: {e}\n")
+            error = True
+        finally:
+            os.chdir(cwd)
+        try:
+            with open(os.path.join(temp_dir, "input" + ext)) as f:
+                output_code = f.read()
+        except FileNotFoundError:
+            output_code = ""
+    return {"code": output_code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "error": error}
+
+
+def main():
+    """Serve requests until stdin is closed."""
+    # Keep a private handle on the real stdout for the protocol and point
+    # fd 1 at stderr, so nothing py2many or a formatter prints can corrupt it.
+    channel = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    requests = sys.stdin.buffer
+
+    while (request := read_message(requests)) is not None:
+        write_message(channel, transpile(request["code"], request["lang"], request["ext"]))
+
+
+if __name__ == "__main__":
+    main()
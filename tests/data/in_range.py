@@ -0,0 +1,17 @@
+from py2many.smt import check_sat, default_value, get_model
+from py2many.smt import pre as smt_pre
+
+x: int = default_value(int)
+y: int = default_value(int)
+
+
+def in_range(x: int, y: int) -> bool:
+    if smt_pre:
+        assert x > 0
+        assert y > 0
+    return x < 10 and y < 10
+
+
+assert not (in_range(x, y) == (x < 10 and y < 10))
+check_sat()
+get_model()
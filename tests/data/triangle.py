@@ -0,0 +1,83 @@
+from adt import adt as sealed
+
+from py2many.smt import check_sat, default_value, get_model
+from py2many.smt import pre as smt_pre
+
+
+@sealed
+class TriangleType:
+    EQUILATERAL: int
+    ISOSCELES: int
+    RIGHT: int
+    ACUTE: int
+    OBTUSE: int
+    ILLEGAL: int
+
+
+a: int = default_value(int)
+b: int = default_value(int)
+c: int = default_value(int)
+
+
+def classify_triangle_correct(a: int, b: int, c: int) -> TriangleType:
+    """Correct implementation that properly sorts sides before classification"""
+    if a == b and b == c:
+        return TriangleType.EQUILATERAL
+    elif a == b or b == c or a == c:
+        return TriangleType.ISOSCELES
+    else:
+        if a >= b and a >= c:
+            if a * a == b * b + c * c:
+                return TriangleType.RIGHT
+            elif a * a < b * b + c * c:
+                return TriangleType.ACUTE
+            else:
+                return TriangleType.OBTUSE
+        elif b >= a and b >= c:
+            if b * b == a * a + c * c:
+                return TriangleType.RIGHT
+            elif b * b < a * a + c * c:
+                return TriangleType.ACUTE
+            else:
+                return TriangleType.OBTUSE
+        else:
+            if c * c == a * a + b * b:
+                return TriangleType.RIGHT
+            elif c * c < a * a + b * b:
+                return TriangleType.ACUTE
+            else:
+                return TriangleType.OBTUSE
+
+
+def classify_triangle(a: int, b: int, c: int) -> TriangleType:
+    """Buggy implementation - assumes a >= b >= c without sorting"""
+    # Pre-condition: all sides must be positive and satisfy triangle inequality
+    if smt_pre:
+        assert a > 0
+        assert b > 0
+        assert c > 0
+        assert a < (b + c)
+
+    if a >= b and b >= c:
+        if a == c or b == c:
+            if a == b and a == c:
+                return TriangleType.EQUILATERAL
+            else:
+                return TriangleType.ISOSCELES
+        else:
+            # BUG: Not sorting sides, assuming a is largest
+            if a * a != b * b + c * c:
+                if a * a < b * b + c * c:
+                    return TriangleType.ACUTE
+                else:
+                    return TriangleType.OBTUSE
+            else:
+                return TriangleType.RIGHT
+    else:
+        return TriangleType.ILLEGAL
+
+
+# Assert that the buggy version differs from correct version
+assert not classify_triangle_correct(a, b, c) == classify_triangle(a, b, c)
+check_sat()
+get_model()
@@ -0,0 +1,126 @@
+"""Tests for the verify_python SMT handling.
+
+triangle.smt and in_range.smt are real ``py2many --smt -`` output (py2many
+0.9) for the .py files next to them.
+"""
+
+import asyncio
+import shutil
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from mcp_server_py2many import server
+
+DATA = Path(__file__).parent / "data"
+
+requires_z3 = pytest.mark.skipif(shutil.which("z3") is None, reason="z3 not installed")
+
+
+def run_z3(smt: bytes) -> str:
+    stdout, _ = asyncio.run(server._run_command_bytes(["z3", "-in"], input=smt))
+    return stdout.decode()
+
+
+def test_parse_smt_records_spans():
+    smt = b'(assert (= a "x)y")) ; trailing (\n(check-sat)'
+    forms = server._parse_smt(smt)
+    assert [smt[f.start:f.end] for f in forms] == [b'(assert (= a "x)y"))', b"(check-sat)"]
+
+
+UNBALANCED = [b"(assert (> x 0)", b"(check-sat))", b'(echo "abc)', b")(", b"(declare-const |x Int)"]
+
+
+@pytest.mark.parametrize("smt", UNBALANCED)
+def test_parse_smt_rejects_unbalanced(smt):
+    with pytest.raises(ValueError):
+        server._parse_smt(smt)
+
+
+@pytest.mark.parametrize("smt", UNBALANCED)
+def test_smt_balanced_rejects_unbalanced(smt):
+    assert not server._smt_balanced(smt)
+
+
+@pytest.mark.parametrize("name", ["triangle.smt", "in_range.smt"])
+def test_smt_balanced_accepts_py2many_output(name):
+    assert server._smt_balanced((DATA / name).read_bytes())
+    assert server._smt_balanced(b'(echo "a ; (") ; )\n(check-sat)')
+
+
+def test_triangle_assertion_is_guarded_with_call_arguments():
+    smt = (DATA / "triangle.smt").read_bytes()
+    assertion = b"(not (= (classify-triangle-correct a b c) (classify-triangle a b c)))"
+    assert server._add_preconditions(smt) == (
+        smt.replace(
+            b"(assert %s)" % assertion,
+            b"(assert (and (classify-triangle-pre a b c) %s))" % assertion,
+        ),
+        True,
+    )
+
+
+def test_multiline_assertion_is_guarded_as_a_whole():
+    smt = (DATA / "in_range.smt").read_bytes().replace(
+        b"(assert (not (= (in-range x y) (and (< x 10) (< y 10)))))",
+        b"(assert (not (= (and\n(< x 10)\n(< y 10)\n) (in-range x y))))",
+    )
+    rewritten, well_formed = server._add_preconditions(smt)
+    assert well_formed
+    assert b"(assert (and (in-range-pre x y) (not (= (and\n(< x 10)\n(< y 10)\n) (in-range x y)))))" in rewritten
+    server._parse_smt(rewritten)
+
+
+def test_already_guarded_assertion_is_unchanged():
+    smt = (DATA / "in_range.smt").read_bytes().replace(
+        b"(assert (not (= (in-range x y)",
+        b"(assert (not (= (and (in-range-pre x y) (in-range x y))",
+    )
+    assert server._add_preconditions(smt) == (smt, True)
+
+
+def test_smt_without_preconditions_is_unchanged():
+    smt = b"(declare-const x Int)\n(assert (not (= (f x) (g x))))\n(check-sat)\n"
+    assert server._add_preconditions(smt) == (smt, True)
+
+
+@pytest.mark.parametrize("smt", [b"(declare-const x Int)\n(assert (> x 0)\n", b"(define-fun f-pre (x Int) Bool\n(assert (not (= (f x) 1)))"])
+def test_malformed_smt_is_reported(smt):
+    assert server._add_preconditions(smt) == (smt, False)
+
+
+@pytest.mark.parametrize(
+    "smt",
+    [
+        b"(declare-const x Int)\n(assert (not (= (f x) (g x))))\n(check-sat)\n",
+        b"(define-fun f-pre ((x Int)) Bool true)\n(assert (> (f x) 0))\n(check-sat)\n",
+    ],
+)
+def test_smt_without_rewrite_targets_is_not_parsed(smt, monkeypatch):
+    def fail(smt):
+        raise AssertionError("parsed")
+
+    monkeypatch.setattr(server, "_parse_smt", fail)
+    assert server._add_preconditions(smt) == (smt, True)
+
+
+@requires_z3
+def test_guarded_triangle_counterexample_satisfies_precondition():
+    smt, _ = server._add_preconditions((DATA / "triangle.smt").read_bytes())
+    output = run_z3(smt + b"\n(eval (classify-triangle-pre a b c))\n")
+    assert "error" not in output
+    assert output.startswith("sat")
+    assert output.rstrip().endswith("true")
+
+
+@requires_z3
+def test_guarded_multiline_assertion_is_valid_smt():
+    smt = (DATA / "in_range.smt").read_bytes().replace(
+        b"(assert (not (= (in-range x y) (and (< x 10) (< y 10)))))",
+        b"(assert (not (= (and\n(< x 10)\n(< y 10)\n) (in-range x y))))",
+    )
+    output = run_z3(server._add_preconditions(smt)[0])
+    # get-model errors after unsat, so only the check-sat answer matters
+    assert output.splitlines()[0] == "unsat"
@@ -0,0 +1,183 @@
+import asyncio
+import io
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from mcp_server_py2many import server
+
+
+class FakeWorker:
+    """Stands in for a py2many worker process; requests block on a gate."""
+
+    started: list["FakeWorker"] = []
+
+    def __init__(self):
+        self.requests: list[str] = []
+        self.gate = asyncio.Event()
+        self.killed = False
+
+    @classmethod
+    async def start(cls) -> "FakeWorker":
+        worker = cls()
+        cls.started.append(worker)
+        return worker
+
+    async def request(self, code: str, lang: str, ext: str) -> dict:
+        self.requests.append(code)
+        await self.gate.wait()
+        if code == "boom":
+            raise RuntimeError("py2many worker exited unexpectedly")
+        return {"code": f"{lang}{ext}:{code}", "stdout": "", "stderr": "", "error": False}
+
+    def kill(self):
+        self.killed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeWorker.started = []
+    monkeypatch.setattr(server, "Py2ManyWorker", FakeWorker)
+    return server.Py2ManyWorkerPool(size=2)
+
+
+def open_gates():
+    for worker in FakeWorker.started:
+        worker.gate.set()
+
+
+def test_identical_requests_share_one_worker_call(pool):
+    async def run():
+        calls = [asyncio.create_task(pool.transpile("x = 1", "rust")) for _ in range(3)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        open_gates()
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(run())
+    assert results == [{"code": "rust.rs:x = 1", "stdout": "", "stderr": "", "error": False}] * 3
+    assert [w.requests for w in FakeWorker.started] == [["x = 1"]]
+
+
+def test_cancelling_one_caller_does_not_cancel_shared_request(pool):
+    async def run():
+        first = asyncio.create_task(pool.transpile("x = 1", "go"))
+        second = asyncio.create_task(pool.transpile("x = 1", "go"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        open_gates()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run())["code"] == "go.go:x = 1"
+
+
+def test_workers_are_reused_after_release(pool):
+    async def run():
+        for code in ("a = 1", "b = 2"):
+            call = asyncio.create_task(pool.transpile(code, "cpp"))
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            open_gates()
+            await call
+
+    asyncio.run(run())
+    assert len(FakeWorker.started) == 1
+    assert FakeWorker.started[0].requests == ["a = 1", "b = 2"]
+
+
+def test_failed_worker_is_discarded(pool):
+    async def run():
+        call = asyncio.create_task(pool.transpile("boom", "cpp"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        open_gates()
+        with pytest.raises(RuntimeError):
+            await call
+        call = asyncio.create_task(pool.transpile("c = 3", "cpp"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        open_gates()
+        return await call
+
+    assert asyncio.run(run())["code"] == "cpp.cpp:c = 3"
+    assert [w.killed for w in FakeWorker.started] == [True, False]
+
+
+def test_timed_out_worker_is_discarded(pool):
+    async def run():
+        with pytest.raises(TimeoutError):
+            await pool.transpile("x = 1", "cpp", timeout=0.01)
+
+    asyncio.run(run())
+    assert FakeWorker.started[0].killed
+
+
+def test_worker_errors_are_not_cached(monkeypatch):
+    calls = []
+
+    async def transpile(code, lang):
+        calls.append(code)
+        return {"code": "", "stdout": "", "stderr": "FileNotFoundError: gone\n", "error": len(calls) == 1}
+
+    monkeypatch.setattr(server._pool, "transpile", transpile)
+    monkeypatch.setattr(server, "_result_cache", OrderedDict())
+
+    async def run():
+        return [await server.run_py2many("x = 1", "rust") for _ in range(3)]
+
+    asyncio.run(run())
+    # The error response is retried; the normal one is then served from cache
+    assert calls == ["x = 1", "x = 1"]
+
+
+def test_message_framing_round_trip():
+    pytest.importorskip("py2many")
+    from mcp_server_py2many.worker import read_message, write_message
+
+    stream = io.BytesIO()
+    write_message(stream, {"code": "x = 1", "lang": "rust", "ext": ".rs"})
+    write_message(stream, {"code": "y = 2", "lang": "go", "ext": ".go"})
+    stream.seek(0)
+    assert read_message(stream) == {"code": "x = 1", "lang": "rust", "ext": ".rs"}
+    assert read_message(stream) == {"code": "y = 2", "lang": "go", "ext": ".go"}
+    assert read_message(stream) is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script formatter stub")
+def test_worker_keeps_code_when_formatter_fails(tmp_path, monkeypatch):
+    pytest.importorskip("py2many")
+    from mcp_server_py2many.worker import transpile
+
+    rustfmt = tmp_path / "rustfmt"
+    rustfmt.write_text("#!/bin/sh\nexit 1\n")
+    rustfmt.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+    result = transpile("def f(x: int) -> int:\n    return x + 1\n", "rust", ".rs")
+    assert "fn f(" in result["code"]
+    assert "rustfmt" in result["stdout"]
+
+
+def test_worker_cwd_survives_failed_kotlin_formatter(tmp_path, monkeypatch):
+    pytest.importorskip("py2many")
+    from mcp_server_py2many.worker import transpile
+
+    # No ktlint/jgo on PATH, so py2many's Kotlin formatting fails after
+    # it has changed directory into the (soon deleted) output directory
+    monkeypatch.setenv("PATH", str(tmp_path))
+    cwd = os.getcwd()
+    # Put the cwd back after the test even if transpile doesn't
+    monkeypatch.chdir(cwd)
+    code = "def f(x: int) -> int:\n    return x + 1\n"
+
+    assert "fun f(" in transpile(code, "kotlin", ".kt")["code"]
+    assert os.getcwd() == cwd
+    assert "fn f(" in transpile(code, "rust", ".rs")["code"]
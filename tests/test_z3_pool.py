@@ -0,0 +1,66 @@
+"""Tests for the pool of warm z3 processes behind verify_python."""
+
+import asyncio
+import shutil
+
+import pytest
+
+pytest.importorskip("mcp")
+
+from mcp_server_py2many import server
+
+pytestmark = pytest.mark.skipif(shutil.which("z3") is None, reason="z3 not installed")
+
+
+def run(coro_fn):
+    async def wrapper():
+        pool = server.Z3Pool(size=1)
+        try:
+            return await coro_fn(pool)
+        finally:
+            await pool.close()
+
+    return asyncio.run(wrapper())
+
+
+def test_sat_and_unsat():
+    async def body(pool):
+        sat = await pool.check(b"(declare-const x Int)(assert (> x 0))(check-sat)", True)
+        unsat = await pool.check(b"(declare-const x Int)(assert (and (> x 0) (< x 0)))(check-sat)", True)
+        return sat.strip(), unsat.strip()
+
+    assert run(body) == ("sat", "unsat")
+
+
+def test_worker_is_reset_and_reused():
+    async def body(pool):
+        await pool.check(b"(declare-const x Int)(assert false)(check-sat)", True)
+        worker = pool._idle[0]
+        # Redeclaring x and dropping the old assertion only works after (reset)
+        output = await pool.check(b"(declare-const x Int)(check-sat)", True)
+        return output.strip(), pool._idle == [worker]
+
+    assert run(body) == ("sat", True)
+
+
+def test_exit_discards_worker():
+    async def body(pool):
+        await pool.check(b"(check-sat)", True)
+        worker = pool._idle[0]
+        output = await pool.check(b"(check-sat)(exit)", True)
+        await worker.proc.wait()
+        return output.strip(), pool._workers
+
+    assert run(body) == ("sat", [])
+
+
+def test_malformed_query_runs_on_one_shot_z3():
+    async def body(pool):
+        output = await pool.check(b"(declare-const x Int)\n(assert (> x 0)\n(check-sat)", False, timeout=5)
+        assert pool._workers == []
+        still_works = await pool.check(b"(check-sat)", True, timeout=5)
+        return output, still_works.strip()
+
+    output, still_works = run(body)
+    assert "error" in output
+    assert still_works == "sat"